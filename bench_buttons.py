@@ -0,0 +1,98 @@
+"""Бенчмарк обновления кнопок поля за клик.
+
+Сравнивает полную пересборку 25 кнопок (как было раньше) с инкрементальным
+обновлением.
+Запуск: `python bench_buttons.py`.
+"""
+import random
+import time
+import tracemalloc
+
+import discord
+
+import main
+
+def rebuild_buttons(view: main.MinesweeperView):
+    """Старый путь: clear_items и 25 новых кнопок на каждый клик"""
+    view.clear_items()
+    block = view.game.blocks[view.block_idx]
+    grid = block['grid']
+    
+    for y in range(5):
+        for x in range(5):
+            button = main.MinesweeperButton(x, y, view.block_idx)
+            
+            if (x, y) in block['cells_revealed']:
+                button.disabled = True
+                value = grid[y][x]
+                if value == 0:
+                    button.label = '·'
+                    button.style = discord.ButtonStyle.secondary
+                else:
+                    button.label = str(value)
+                    button.style = discord.ButtonStyle.primary
+            
+            view.add_item(button)
+
+def play_clicks(game: main.MinesweeperGame):
+    """Открывает безопасные клетки блока 0 по одной, как игрок"""
+    block = game.blocks[0]
+    for y in range(5):
+        for x in range(5):
+            if (x, y) not in block['mines'] and (x, y) not in block['cells_revealed']:
+                _, revealed = game.reveal_cell(0, x, y)
+                block['cells_revealed'].update(revealed)
+                yield
+
+def measure(update, serialize, boards: int, trace: bool):
+    random.seed(1)
+    games = [main.MinesweeperGame() for _ in range(boards)]
+    views = [main.MinesweeperView(game, 0, 1, 1) for game in games]
+    
+    clicks = 0
+    update_time = serialize_time = 0.0
+    update_alloc = serialize_alloc = 0
+    
+    if trace:
+        tracemalloc.start()
+    for game, view in zip(games, views):
+        for _ in play_clicks(game):
+            if trace:
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            started = time.perf_counter()
+            update(view)
+            updated = time.perf_counter()
+            if trace:
+                update_alloc += tracemalloc.get_traced_memory()[1] - current
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            serialize(view)
+            finished = time.perf_counter()
+            if trace:
+                serialize_alloc += tracemalloc.get_traced_memory()[1] - current
+            
+            update_time += updated - started
+            serialize_time += finished - updated
+            clicks += 1
+    if trace:
+        tracemalloc.stop()
+    
+    return clicks, update_time, serialize_time, update_alloc, serialize_alloc
+
+def benchmark(boards: int = 300):
+    variants = [
+        ('Пересборка', rebuild_buttons, lambda view: discord.ui.View.to_components(view)),
+        ('Инкрементально', main.MinesweeperView.update_buttons, main.MinesweeperView.to_components),
+    ]
+    for name, update, serialize in variants:
+        _, _, _, update_alloc, serialize_alloc = measure(update, serialize, boards, trace=True)
+        clicks, update_time, serialize_time, _, _ = measure(update, serialize, boards, trace=False)
+        print(
+            f'{name}: {clicks} кликов | '
+            f'обновление {update_time / clicks * 1e6:.1f}мкс, {update_alloc / clicks / 1024:.2f}КиБ | '
+            f'сериализация {serialize_time / clicks * 1e6:.1f}мкс, {serialize_alloc / clicks / 1024:.2f}КиБ'
+        )
+
+if __name__ == "__main__":
+    benchmark()
@@ -3,11 +3,19 @@ from discord import app_commands
 from discord.ext import commands
 import asyncpg
 import os
+import json
+import hashlib
 import random
 import time
 from typing import Optional, List, Tuple, Dict
 from datetime import datetime, timedelta
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+
+import anticheat
 
 # Конфигурация
 DATABASE_URL = os.getenv('DATABASE_URL')  # Session pooler connection string
@@ -16,50 +24,239 @@ TOKEN = os.getenv('DISCORD_TOKEN')
 intents = discord.Intents.default()
 intents.message_content = True
 
+# Процессы для анализа игр на читы (не нагружают event loop)
+ANTICHEAT_WORKERS = int(os.getenv('ANTICHEAT_WORKERS', '2'))
+ANTICHEAT_TIMEOUT = 5.0  # Секунды; дольше — игра сохраняется без проверки
+
+# Бюджет времени на запуск (секунды до on_ready)
+STARTUP_BUDGET = float(os.getenv('STARTUP_BUDGET', '5.0'))
+
+# Версионированные миграции схемы: каждая применяется один раз
+MIGRATIONS: List[Tuple[int, List[str]]] = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS players (
+            user_id BIGINT PRIMARY KEY,
+            username TEXT,
+            total_blocks_cleared INTEGER DEFAULT 0,
+            total_time_spent FLOAT DEFAULT 0,
+            best_speed FLOAT DEFAULT 0,
+            games_played INTEGER DEFAULT 0,
+            best_blocks_normal INTEGER DEFAULT 0,
+            best_blocks_hardcore INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS speed_leaderboard (
+            user_id BIGINT PRIMARY KEY,
+            username TEXT,
+            avg_speed FLOAT,
+            total_blocks INTEGER,
+            total_time FLOAT,
+            last_updated TIMESTAMP DEFAULT NOW(),
+            FOREIGN KEY (user_id) REFERENCES players(user_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_players_best_speed ON players(best_speed DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_speed_leaderboard ON speed_leaderboard(avg_speed DESC)',
+    ]),
+    (2, [
+        '''
+        CREATE TABLE IF NOT EXISTS bot_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        ''',
+    ]),
+    (3, [
+        '''
+        CREATE TABLE IF NOT EXISTS block_times (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            mode TEXT NOT NULL,
+            block_time FLOAT NOT NULL,
+            clicks INTEGER NOT NULL,
+            recorded_at TIMESTAMP DEFAULT NOW()
+        )
+        ''',
+        # Порядок — по id: NOW() одинаков для всех блоков одной транзакции
+        'CREATE INDEX IF NOT EXISTS idx_block_times_user ON block_times(user_id, mode, id DESC)',
+        '''
+        ALTER TABLE players
+            ADD COLUMN IF NOT EXISTS fastest_block_normal FLOAT,
+            ADD COLUMN IF NOT EXISTS median_block_normal FLOAT,
+            ADD COLUMN IF NOT EXISTS block_cv_normal FLOAT,
+            ADD COLUMN IF NOT EXISTS fastest_block_hardcore FLOAT,
+            ADD COLUMN IF NOT EXISTS median_block_hardcore FLOAT,
+            ADD COLUMN IF NOT EXISTS block_cv_hardcore FLOAT,
+            ADD COLUMN IF NOT EXISTS total_clicks INTEGER DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS avg_latency_ms FLOAT DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS latency_samples INTEGER DEFAULT 0
+        ''',
+    ]),
+    (4, [
+        '''
+        CREATE TABLE IF NOT EXISTS flagged_games (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            mode TEXT NOT NULL,
+            blocks INTEGER NOT NULL,
+            total_time FLOAT NOT NULL,
+            score FLOAT NOT NULL,
+            reasons TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+        ''',
+    ]),
+]
+
 class MinesweeperBot(commands.Bot):
     def __init__(self):
         super().__init__(command_prefix='!', intents=intents)
         self.db_pool = None
         self.active_games = {}  # Хранение игр в памяти для скорости
+        self.boot_started = time.perf_counter()
+        self.startup_timings: Dict[str, float] = {}
+        self.startup_reported = False
+        self.sync_task: Optional[asyncio.Task] = None
+        self.background_tasks: set = set()  # Ссылки на фоновые задачи, чтобы их не собрал GC
+        self.anticheat_pool: Optional[ProcessPoolExecutor] = None
     
     async def setup_hook(self):
-        await self.tree.sync()
-        self.db_pool = await asyncpg.create_pool(DATABASE_URL, min_size=2, max_size=10)
+        self.create_anticheat_pool()
+        
+        # Пул БД и прогрев кэшей параллельно, затем миграции
+        await asyncio.gather(self.create_db_pool(), self.warm_caches())
+        
+        started = time.perf_counter()
         await self.init_database()
+        self.startup_timings['migrations'] = time.perf_counter() - started
+        
+        # Синхронизация команд не задерживает запуск
+        self.sync_task = self.loop.create_task(self.sync_commands())
+    
+    def create_anticheat_pool(self):
+        """Пул воркеров античита. forkserver: воркеры не копируют многопоточный процесс бота"""
+        self.anticheat_pool = ProcessPoolExecutor(
+            max_workers=ANTICHEAT_WORKERS,
+            mp_context=multiprocessing.get_context('forkserver')
+        )
+    
+    def reset_anticheat_pool(self, pool: ProcessPoolExecutor):
+        """Заменяет сломанный или зависший пул (если его ещё не заменила другая игра)"""
+        if self.anticheat_pool is not pool:
+            return
+        pool.shutdown(wait=False, cancel_futures=True)
+        self.create_anticheat_pool()
+    
+    async def close(self):
+        await super().close()
+        if self.anticheat_pool is not None:
+            self.anticheat_pool.shutdown(wait=False, cancel_futures=True)
+            self.anticheat_pool = None
+    
+    async def create_db_pool(self):
+        started = time.perf_counter()
+        self.db_pool = await asyncpg.create_pool(DATABASE_URL, min_size=2, max_size=10)
+        self.startup_timings['db_pool'] = time.perf_counter() - started
+    
+    async def warm_caches(self):
+        """Заранее рендерит стартовое (закрытое) поле в кэш кнопок"""
+        started = time.perf_counter()
+        MinesweeperView(MinesweeperGame(), 0, 0, 0).to_components()
+        self.startup_timings['warm_cache'] = time.perf_counter() - started
     
     async def init_database(self):
+        """Применяет ещё не выполненные миграции"""
         async with self.db_pool.acquire() as conn:
             await conn.execute('''
-                CREATE TABLE IF NOT EXISTS players (
-                    user_id BIGINT PRIMARY KEY,
-                    username TEXT,
-                    total_blocks_cleared INTEGER DEFAULT 0,
-                    total_time_spent FLOAT DEFAULT 0,
-                    best_speed FLOAT DEFAULT 0,
-                    games_played INTEGER DEFAULT 0,
-                    best_blocks_normal INTEGER DEFAULT 0,
-                    best_blocks_hardcore INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT NOW()
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    applied_at TIMESTAMP DEFAULT NOW()
                 )
             ''')
             
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS speed_leaderboard (
-                    user_id BIGINT PRIMARY KEY,
-                    username TEXT,
-                    avg_speed FLOAT,
-                    total_blocks INTEGER,
-                    total_time FLOAT,
-                    last_updated TIMESTAMP DEFAULT NOW(),
-                    FOREIGN KEY (user_id) REFERENCES players(user_id)
-                )
-            ''')
+            applied = {r['version'] for r in await conn.fetch('SELECT version FROM schema_migrations')}
+            
+            for version, statements in MIGRATIONS:
+                if version in applied:
+                    continue
+                
+                async with conn.transaction():
+                    for statement in statements:
+                        await conn.execute(statement)
+                    await conn.execute(
+                        'INSERT INTO schema_migrations (version) VALUES ($1) ON CONFLICT DO NOTHING',
+                        version
+                    )
+                print(f'🗄️ Миграция #{version} применена')
+    
+    def commands_hash(self) -> str:
+        """Хэш определений slash-команд"""
+        payload = []
+        for command in self.tree.get_commands():
+            try:
+                payload.append(command.to_dict(self.tree))
+            except TypeError:  # discord.py < 2.4
+                payload.append(command.to_dict())
+        payload.sort(key=lambda c: c['name'])
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    
+    async def sync_commands(self):
+        """Синхронизирует команды, только если изменились их определения"""
+        started = time.perf_counter()
+        # Хэш хранится по приложению: разные токены могут делить одну БД
+        meta_key = f'commands_hash:{self.application_id}'
+        try:
+            digest = self.commands_hash()
+            
+            async with self.db_pool.acquire() as conn:
+                stored = await conn.fetchval('SELECT value FROM bot_meta WHERE key = $1', meta_key)
+            
+            if stored == digest:
+                print('🔁 Команды не изменились, синхронизация пропущена')
+                return
+            
+            await self.tree.sync()
+            
+            async with self.db_pool.acquire() as conn:
+                await conn.execute('''
+                    INSERT INTO bot_meta (key, value) VALUES ($1, $2)
+                    ON CONFLICT (key) DO UPDATE SET value = $2
+                ''', meta_key, digest)
             
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_players_best_speed ON players(best_speed DESC)')
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_speed_leaderboard ON speed_leaderboard(avg_speed DESC)')
+            print(f'🔁 Команды синхронизированы за {time.perf_counter() - started:.2f}с')
+        except Exception as e:
+            print(f'❌ Ошибка синхронизации команд: {e}')
+    
+    def report_startup(self):
+        """Отчёт о времени запуска (один раз)"""
+        if self.startup_reported:
+            return
+        self.startup_reported = True
+        
+        total = time.perf_counter() - self.boot_started
+        status = "✅" if total <= STARTUP_BUDGET else "⚠️"
+        stages = " | ".join(f"{name} {value:.2f}с" for name, value in self.startup_timings.items())
+        print(f'{status} Запуск: {total:.2f}с (бюджет {STARTUP_BUDGET:.1f}с)')
+        print(f'   {stages}')
 
 bot = MinesweeperBot()
 
+# Мультиплеер: параллельные дорожки блоков, число дорожек растёт с числом игроков
+MAX_LANES = 4
+PLAYERS_PER_LANE = 2
+BLOCKS_PER_LANE = 2
+SEND_ATTEMPTS = 3  # Попыток отправить блок, прежде чем снять дорожку
+
+# Кольцевые буферы таймингов: сбрасываются в БД одним пакетом в конце игры
+CLICK_BUFFER_SIZE = 4096
+BLOCK_BUFFER_SIZE = 1024
+
+# Медиана и стабильность считаются по последним N блокам игрока в каждом режиме
+BLOCK_STATS_WINDOW = 500
+
 class MinesweeperGame:
     def __init__(self, mode='normal', is_multiplayer=False):
         self.mode = mode
@@ -68,14 +265,89 @@ class MinesweeperGame:
         self.start_time = time.time()
         self.last_action_time = time.time()
         self.hardcore_timer = 30.0 if mode == 'hardcore' else 0
+        self.is_over = False
         
-        # Вертикальная цепочка блоков: {block_index: {grid, mines, cells_revealed, message_id, completed}}
+        # Блоки: {block_index: {grid, mines, cells_revealed, message_id, completed, lane}}
         self.blocks: Dict[int, dict] = {}
-        self.current_max_block = 1  # Максимальный отправленный блок
+        self.next_block_idx = 0
+        
+        # Дорожки: {lane: {'blocks': [block_index, ...], 'pending': незавершённых блоков}}
+        self.lanes: Dict[int, dict] = {}
+        
+        # Вклад игроков: {user_id: {'name', 'clicks', 'cells', 'blocks'}}
+        self.players: Dict[int, dict] = {}
+        
+        # Клики: (время клика, user_id, block_index, задержка ответа, результат)
+        self.clicks: deque = deque(maxlen=CLICK_BUFFER_SIZE)
+        # Пройденные блоки: (user_id, время прохождения, кликов, минимум кликов)
+        self.block_times: deque = deque(maxlen=BLOCK_BUFFER_SIZE)
+        
+        # Первая дорожка
+        self.fill_lane(0)
+    
+    def fill_lane(self, lane: int) -> List[int]:
+        """Генерирует следующую партию блоков дорожки"""
+        new_blocks = []
+        for _ in range(BLOCKS_PER_LANE):
+            block_idx = self.next_block_idx
+            self.next_block_idx += 1
+            self.generate_block(block_idx)
+            self.blocks[block_idx]['lane'] = lane
+            new_blocks.append(block_idx)
+        
+        self.lanes[lane] = {'blocks': new_blocks, 'pending': len(new_blocks)}
+        return new_blocks
+    
+    def desired_lanes(self) -> int:
+        if not self.is_multiplayer:
+            return 1
+        return min(MAX_LANES, max(1, -(-len(self.players) // PLAYERS_PER_LANE)))
+    
+    def register_click(self, user_id: int, username: str) -> Optional[int]:
+        """Учитывает клик игрока. Возвращает номер новой дорожки, если её пора открыть"""
+        player = self.players.get(user_id)
+        if player is None:
+            player = {'name': username, 'clicks': 0, 'cells': 0, 'blocks': 0}
+            self.players[user_id] = player
+        player['clicks'] += 1
+        
+        # Проверяется на каждом клике: снятая после сбоя дорожка откроется заново
+        if len(self.lanes) < self.desired_lanes():
+            return next(lane for lane in range(MAX_LANES) if lane not in self.lanes)
+        return None
+    
+    def drop_lane(self, lane: int) -> List[int]:
+        """Снимает дорожку с её блоками. Возвращает message_id уже отправленных блоков"""
+        message_ids = []
+        for block_idx in self.lanes.pop(lane)['blocks']:
+            block = self.blocks.pop(block_idx, None)
+            if block and block['message_id']:
+                message_ids.append(block['message_id'])
+        return message_ids
+    
+    def record_click(self, user_id: int, block_idx: int, clicked_at: float, latency: float, result: str):
+        """Записывает клик в кольцевой буфер"""
+        self.clicks.append((clicked_at, user_id, block_idx, latency, result))
+        if block_idx in self.blocks:
+            self.blocks[block_idx]['clicks'] += 1
+    
+    def complete_block(self, block_idx: int, user_id: int) -> bool:
+        """Помечает блок пройденным. Возвращает True, если пройдена вся партия дорожки"""
+        block = self.blocks[block_idx]
+        block['completed'] = True
+        self.blocks_cleared += 1
+        self.block_times.append((user_id, time.time() - block['started_at'], block['clicks'], block['min_clicks']))
+        if user_id in self.players:
+            self.players[user_id]['blocks'] += 1
         
-        # Генерируем первые 2 блока
-        self.generate_block(0)
-        self.generate_block(1)
+        lane = self.lanes[block['lane']]
+        lane['pending'] -= 1
+        return lane['pending'] == 0
+    
+    def block_title(self, block_idx: int) -> str:
+        if len(self.lanes) > 1:
+            return f"Дорожка {self.blocks[block_idx]['lane'] + 1} · Блок #{block_idx + 1}"
+        return f"Блок #{block_idx + 1}"
     
     def generate_block(self, block_index: int):
         """Генерирует один блок 5x5"""
@@ -111,9 +383,44 @@ class MinesweeperGame:
             'mines': mines,
             'cells_revealed': set(),
             'message_id': None,
-            'completed': False
+            'completed': False,
+            'started_at': time.time(),
+            'clicks': 0,
+            'min_clicks': self.min_clicks(grid)
         }
     
+    def min_clicks(self, grid: List[List[int]]) -> int:
+        """Минимум кликов для прохождения блока (3BV): области нулей + числа вне их границ"""
+        opened = set()
+        clicks = 0
+        
+        for y in range(5):
+            for x in range(5):
+                if grid[y][x] != 0 or (x, y) in opened:
+                    continue
+                
+                # Один клик по нулю открывает всю область вместе с границей
+                clicks += 1
+                stack = [(x, y)]
+                while stack:
+                    cx, cy = stack.pop()
+                    if (cx, cy) in opened:
+                        continue
+                    opened.add((cx, cy))
+                    if grid[cy][cx] == 0:
+                        for dy in [-1, 0, 1]:
+                            for dx in [-1, 0, 1]:
+                                nx, ny = cx + dx, cy + dy
+                                if 0 <= nx < 5 and 0 <= ny < 5 and (nx, ny) not in opened:
+                                    stack.append((nx, ny))
+        
+        for y in range(5):
+            for x in range(5):
+                if grid[y][x] > 0 and (x, y) not in opened:
+                    clicks += 1
+        
+        return clicks
+    
     def get_time_bonus_hardcore(self):
         base_bonus = 18
         reduction = (self.blocks_cleared // 5) * 1
@@ -168,6 +475,10 @@ class MinesweeperGame:
         
         return revealed_safe == total_safe
 
+# Кэш сериализованных кнопок только для полностью закрытого поля — единственного
+# состояния, которое повторяется у каждого нового блока. Ключ — флаг блокировки
+components_cache: Dict[bool, list] = {}
+
 class MinesweeperView(discord.ui.View):
     def __init__(self, game: MinesweeperGame, block_idx: int, user_id: int, thread_id: int):
         super().__init__(timeout=None)
@@ -175,32 +486,55 @@ class MinesweeperView(discord.ui.View):
         self.block_idx = block_idx
         self.user_id = user_id
         self.thread_id = thread_id
+        self.locked = False
+        self.rendered: set = set()  # Клетки, уже отрисованные как открытые
+        self.buttons: Dict[Tuple[int, int], MinesweeperButton] = {}
+        
+        # Кнопки создаются один раз, дальше меняются только открытые клетки
+        if self.block_idx in self.game.blocks:
+            for y in range(5):
+                for x in range(5):
+                    button = MinesweeperButton(x, y, self.block_idx)
+                    self.buttons[(x, y)] = button
+                    self.add_item(button)
+        
         self.update_buttons()
     
     def update_buttons(self):
-        self.clear_items()
-        
         if self.block_idx not in self.game.blocks:
             return
         
         block = self.game.blocks[self.block_idx]
         grid = block['grid']
         
-        for y in range(5):
-            for x in range(5):
-                button = MinesweeperButton(x, y, self.block_idx)
-                
-                if (x, y) in block['cells_revealed']:
-                    button.disabled = True
-                    value = grid[y][x]
-                    if value == 0:
-                        button.label = '·'
-                        button.style = discord.ButtonStyle.secondary
-                    else:
-                        button.label = str(value)
-                        button.style = discord.ButtonStyle.primary
-                
-                self.add_item(button)
+        for x, y in block['cells_revealed'] - self.rendered:
+            button = self.buttons[(x, y)]
+            button.disabled = True
+            value = grid[y][x]
+            if value == 0:
+                button.label = '·'
+                button.style = discord.ButtonStyle.secondary
+            else:
+                button.label = str(value)
+                button.style = discord.ButtonStyle.primary
+            self.rendered.add((x, y))
+    
+    def lock(self):
+        """Отключает все кнопки блока"""
+        self.locked = True
+        for item in self.children:
+            item.disabled = True
+    
+    def to_components(self):
+        # Открытые клетки почти никогда не повторяются между полями — их не кэшируем
+        if self.rendered or self.block_idx not in self.game.blocks:
+            return super().to_components()
+        
+        payload = components_cache.get(self.locked)
+        if payload is None:
+            payload = super().to_components()
+            components_cache[self.locked] = payload
+        return payload
     
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if not self.game.is_multiplayer and interaction.user.id != self.user_id:
@@ -210,7 +544,8 @@ class MinesweeperView(discord.ui.View):
 
 class MinesweeperButton(discord.ui.Button):
     def __init__(self, x: int, y: int, block_idx: int):
-        super().__init__(style=discord.ButtonStyle.success, label='❔', row=y)
+        # Постоянный custom_id: закрытое поле можно брать из кэша
+        super().__init__(style=discord.ButtonStyle.success, label='❔', row=y, custom_id=f'ms:{x}:{y}')
         self.x = x
         self.y = y
         self.block_idx = block_idx
@@ -221,10 +556,25 @@ class MinesweeperButton(discord.ui.Button):
         
         # ОПТИМИЗАЦИЯ: Немедленный defer для скорости
         await interaction.response.defer()
+        clicked_at = interaction.created_at.timestamp()
+        latency = max(0.0, time.time() - clicked_at)  # Клик → ответ Discord
+        
+        if game.is_over:
+            return
         
         game.last_action_time = time.time()
         
+        # Новый игрок может открыть ещё одну дорожку
+        new_lane = game.register_click(interaction.user.id, str(interaction.user))
+        if new_lane is not None:
+            # Блоки генерируются сразу, а отправляются в фоне — клик не ждёт
+            game.fill_lane(new_lane)
+            task = asyncio.create_task(send_lane(interaction.channel, game, new_lane, view.user_id, view.thread_id))
+            bot.background_tasks.add(task)
+            task.add_done_callback(bot.background_tasks.discard)
+        
         result, revealed = game.reveal_cell(self.block_idx, self.x, self.y)
+        game.record_click(interaction.user.id, self.block_idx, clicked_at, latency, result)
         
         if result == 'invalid' or result == 'already_revealed':
             return
@@ -236,12 +586,13 @@ class MinesweeperButton(discord.ui.Button):
         # Добавляем открытые клетки
         block = game.blocks[self.block_idx]
         block['cells_revealed'].update(revealed)
+        game.players[interaction.user.id]['cells'] += len(revealed)
         
         # Проверяем, завершён ли блок
         if game.is_block_complete(self.block_idx):
             await self.handle_block_complete(interaction, view)
         else:
-            # ОПТИМИЗАЦИЯ: Обновляем только кнопки, без пересоздания view
+            # ОПТИМИЗАЦИЯ: Обновляем только изменившиеся кнопки, без пересоздания view
             view.update_buttons()
             
             timer_text = ""
@@ -250,7 +601,7 @@ class MinesweeperButton(discord.ui.Button):
             
             try:
                 await interaction.edit_original_response(
-                    content=f"🎮 Блок #{self.block_idx + 1}{timer_text}",
+                    content=f"🎮 {game.block_title(self.block_idx)}{timer_text}",
                     view=view
                 )
             except:
@@ -258,6 +609,7 @@ class MinesweeperButton(discord.ui.Button):
     
     async def handle_game_over(self, interaction: discord.Interaction, view: MinesweeperView):
         game = view.game
+        game.is_over = True
         
         # Показываем все бомбы в текущем блоке
         block = game.blocks[self.block_idx]
@@ -265,48 +617,13 @@ class MinesweeperButton(discord.ui.Button):
             block['cells_revealed'].add((x, y))
         
         view.update_buttons()
-        for item in view.children:
-            item.disabled = True
+        view.lock()
         
         total_time = time.time() - game.start_time
         avg_speed = game.blocks_cleared / total_time if total_time > 0 and game.blocks_cleared > 0 else 0
         
         # Сохраняем статистику
-        async with bot.db_pool.acquire() as conn:
-            if game.mode == 'hardcore':
-                await conn.execute('''
-                    INSERT INTO players (user_id, username, total_blocks_cleared, total_time_spent, best_speed, games_played, best_blocks_hardcore)
-                    VALUES ($1, $2, $3, $4, $5, 1, $6)
-                    ON CONFLICT (user_id) DO UPDATE SET
-                        total_blocks_cleared = players.total_blocks_cleared + $3,
-                        total_time_spent = players.total_time_spent + $4,
-                        best_speed = CASE WHEN $5 > players.best_speed THEN $5 ELSE players.best_speed END,
-                        games_played = players.games_played + 1,
-                        best_blocks_hardcore = CASE WHEN $6 > players.best_blocks_hardcore THEN $6 ELSE players.best_blocks_hardcore END
-                ''', interaction.user.id, str(interaction.user), game.blocks_cleared, total_time, avg_speed, game.blocks_cleared)
-            else:
-                await conn.execute('''
-                    INSERT INTO players (user_id, username, total_blocks_cleared, total_time_spent, best_speed, games_played, best_blocks_normal)
-                    VALUES ($1, $2, $3, $4, $5, 1, $6)
-                    ON CONFLICT (user_id) DO UPDATE SET
-                        total_blocks_cleared = players.total_blocks_cleared + $3,
-                        total_time_spent = players.total_time_spent + $4,
-                        best_speed = CASE WHEN $5 > players.best_speed THEN $5 ELSE players.best_speed END,
-                        games_played = players.games_played + 1,
-                        best_blocks_normal = CASE WHEN $6 > players.best_blocks_normal THEN $6 ELSE players.best_blocks_normal END
-                ''', interaction.user.id, str(interaction.user), game.blocks_cleared, total_time, avg_speed, game.blocks_cleared)
-            
-            # Обновляем speed leaderboard
-            total_blocks = await conn.fetchval('SELECT total_blocks_cleared FROM players WHERE user_id = $1', interaction.user.id)
-            total_time_all = await conn.fetchval('SELECT total_time_spent FROM players WHERE user_id = $1', interaction.user.id)
-            new_avg_speed = total_blocks / total_time_all if total_time_all > 0 else 0
-            
-            await conn.execute('''
-                INSERT INTO speed_leaderboard (user_id, username, avg_speed, total_blocks, total_time)
-                VALUES ($1, $2, $3, $4, $5)
-                ON CONFLICT (user_id) DO UPDATE SET
-                    avg_speed = $3, total_blocks = $4, total_time = $5, last_updated = NOW()
-            ''', interaction.user.id, str(interaction.user), new_avg_speed, total_blocks, total_time_all)
+        await save_game_stats(game, interaction.user.id, str(interaction.user), total_time)
         
         # Удаляем игру из памяти
         if view.thread_id in bot.active_games:
@@ -318,7 +635,8 @@ class MinesweeperButton(discord.ui.Button):
                 content=f"{mode_emoji} **ИГРА ОКОНЧЕНА!**\n"
                         f"Блоков пройдено: **{game.blocks_cleared}**\n"
                         f"Время игры: **{total_time:.2f}с**\n"
-                        f"Средняя скорость: **{avg_speed:.3f} блоков/сек**",
+                        f"Средняя скорость: **{avg_speed:.3f} блоков/сек**"
+                        f"{contributions_text(game)}",
                 view=view
             )
         except:
@@ -329,37 +647,29 @@ class MinesweeperButton(discord.ui.Button):
         thread = interaction.channel
         
         # Помечаем блок как завершённый
-        game.blocks[self.block_idx]['completed'] = True
-        game.blocks_cleared += 1
+        lane_complete = game.complete_block(self.block_idx, interaction.user.id)
         
         # Обновляем хардкор таймер
         if game.mode == 'hardcore':
             bonus = game.get_time_bonus_hardcore()
             game.hardcore_timer += bonus
         
-        # Отключаем кнопки завершённого блока
-        for item in view.children:
-            item.disabled = True
+        # Отрисовываем последние открытые клетки и отключаем кнопки блока
+        view.update_buttons()
+        view.lock()
         
         try:
             await interaction.edit_original_response(
-                content=f"✅ **Блок #{self.block_idx + 1} пройден!**",
+                content=f"✅ **{game.block_title(self.block_idx)} пройден!**",
                 view=view
             )
         except:
             pass
         
-        # Проверяем, все ли видимые блоки завершены
-        all_visible_complete = all(
-            game.blocks[i]['completed'] 
-            for i in range(game.current_max_block + 1) 
-            if i in game.blocks
-        )
-        
-        if all_visible_complete:
-            # Удаляем завершённые блоки
-            completed_blocks = [i for i in game.blocks if game.blocks[i]['completed']]
-            for block_idx in completed_blocks:
+        # Вся партия блоков дорожки пройдена — удаляем её и выдаём следующую
+        if lane_complete:
+            lane = game.blocks[self.block_idx]['lane']
+            for block_idx in game.lanes[lane]['blocks']:
                 try:
                     msg_id = game.blocks[block_idx]['message_id']
                     if msg_id:
@@ -369,17 +679,205 @@ class MinesweeperButton(discord.ui.Button):
                     pass
                 del game.blocks[block_idx]
             
-            # Генерируем новые блоки
-            new_block_1 = game.current_max_block + 1
-            new_block_2 = game.current_max_block + 2
+            # Генерируем и отправляем новые блоки
+            game.fill_lane(lane)
+            await send_lane(thread, game, lane, view.user_id, view.thread_id)
+
+async def flush_timings(conn, game: MinesweeperGame, user_ids: List[int]):
+    """Пакетно сбрасывает буферы таймингов и пересчитывает агрегаты в players"""
+    block_times = [entry for entry in game.block_times if entry[0] in user_ids]
+    if block_times:
+        await conn.copy_records_to_table(
+            'block_times',
+            records=[(uid, game.mode, block_time, clicks) for uid, block_time, clicks, _ in block_times],
+            columns=['user_id', 'mode', 'block_time', 'clicks']
+        )
+    
+    # Задержка — только по кликам, оставшимся в буфере; число кликов — точное
+    latency: Dict[int, List[float]] = {uid: [0, 0.0] for uid in user_ids}
+    for _, uid, _, click_latency, _ in game.clicks:
+        if uid in latency:
+            latency[uid][0] += 1
+            latency[uid][1] += click_latency * 1000
+    
+    await conn.executemany('''
+        UPDATE players SET
+            avg_latency_ms = CASE WHEN latency_samples + $3 > 0
+                THEN (avg_latency_ms * latency_samples + $4) / (latency_samples + $3) ELSE 0 END,
+            latency_samples = latency_samples + $3,
+            total_clicks = total_clicks + $2
+        WHERE user_id = $1
+    ''', [
+        (uid, game.players[uid]['clicks'] if uid in game.players else 0, samples, total)
+        for uid, (samples, total) in latency.items()
+    ])
+    
+    if not block_times:
+        return
+    
+    block_user_ids = sorted({entry[0] for entry in block_times})
+    
+    # Храним только последние BLOCK_STATS_WINDOW блоков игрока в режиме игры
+    await conn.execute('''
+        DELETE FROM block_times b
+        USING (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id DESC) AS rn
+            FROM block_times WHERE user_id = ANY($1::bigint[]) AND mode = $2
+        ) old
+        WHERE b.id = old.id AND old.rn > $3
+    ''', block_user_ids, game.mode, BLOCK_STATS_WINDOW)
+    
+    # В хардкоре больше мин — тайминги режимов не смешиваем
+    fastest, median, cv = (f'{column}_{game.mode}' for column in ('fastest_block', 'median_block', 'block_cv'))
+    await conn.execute(f'''
+        UPDATE players p SET
+            {fastest} = LEAST(p.{fastest}, s.fastest),
+            {median} = s.median,
+            {cv} = s.cv
+        FROM (
+            SELECT user_id,
+                   MIN(block_time) AS fastest,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY block_time) AS median,
+                   COALESCE(stddev_samp(block_time) / NULLIF(AVG(block_time), 0), 0) AS cv
+            FROM block_times WHERE user_id = ANY($1::bigint[]) AND mode = $2
+            GROUP BY user_id
+        ) s
+        WHERE p.user_id = s.user_id
+    ''', block_user_ids, game.mode)
+
+async def analyze_game(game: MinesweeperGame, total_time: float) -> Dict[int, anticheat.GameScore]:
+    """Оценивает игру в пуле процессов. Возвращает только подозрительных игроков"""
+    if bot.anticheat_pool is None:
+        return {}
+    
+    clicks: Dict[int, List[float]] = {uid: [] for uid in game.players}
+    for clicked_at, uid, _, _, _ in game.clicks:
+        if uid in clicks:
+            clicks[uid].append(clicked_at)
+    
+    # Клики пройденных игроком блоков против минимально необходимых
+    block_clicks: Dict[int, List[int]] = {uid: [0, 0] for uid in game.players}
+    for uid, _, used, needed in game.block_times:
+        if uid in block_clicks:
+            block_clicks[uid][0] += used
+            block_clicks[uid][1] += needed
+    
+    # Клики дописываются в порядке обработки, а не нажатия — сортируем по времени
+    summaries = [
+        (uid, tuple(sorted(clicks[uid])), block_clicks[uid][0], block_clicks[uid][1], player['blocks'], total_time)
+        for uid, player in game.players.items()
+    ]
+    if not summaries:
+        return {}
+    
+    pool = bot.anticheat_pool
+    try:
+        loop = asyncio.get_running_loop()
+        results = await asyncio.wait_for(
+            loop.run_in_executor(pool, anticheat.score_games, summaries),
+            timeout=ANTICHEAT_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        # Зависший воркер занимает слот пула — заменяем пул
+        print(f'⚠️ Анализ игры не уложился в {ANTICHEAT_TIMEOUT:.0f}с, сохраняем без проверки')
+        bot.reset_anticheat_pool(pool)
+        return {}
+    except BrokenProcessPool as e:
+        # Воркер умер (например, OOM) — сломанный пул больше не примет задачи
+        print(f'❌ Пул античита сломан, пересоздаём: {e}')
+        bot.reset_anticheat_pool(pool)
+        return {}
+    except Exception as e:
+        print(f'❌ Ошибка анализа игры: {e}')
+        return {}
+    
+    return {result[0]: result for result in results if anticheat.is_flagged(result)}
+
+def contributions_text(game: MinesweeperGame) -> str:
+    """Вклад игроков для итогового сообщения мультиплеера"""
+    if not game.is_multiplayer or not game.players:
+        return ""
+    
+    ranking = sorted(game.players.values(), key=lambda p: (p['blocks'], p['cells']), reverse=True)
+    text = "\n\n👥 **Вклад игроков:**\n"
+    for player in ranking[:10]:
+        text += f"• **{player['name']}** — блоков: {player['blocks']}, клеток: {player['cells']}, кликов: {player['clicks']}\n"
+    return text
+
+async def save_game_stats(game: MinesweeperGame, user_id: int, username: str, total_time: float):
+    """Сохраняет итоги игры для всех участников за один заход в БД"""
+    if game.players:
+        contributions = [(uid, p['name'], p['blocks']) for uid, p in game.players.items()]
+    else:
+        contributions = [(user_id, username, game.blocks_cleared)]
+    # Единый порядок блокировки строк по user_id — иначе параллельные игры с общими игроками дают deadlock
+    contributions.sort()
+    
+    # Подозрительные результаты не попадают в рекорды и таблицы лидеров
+    flagged = await analyze_game(game, total_time)
+    
+    best_column = 'best_blocks_hardcore' if game.mode == 'hardcore' else 'best_blocks_normal'
+    rows = [
+        (uid, name, 0, 0.0, 0) if uid in flagged else
+        (uid, name, blocks, total_time, blocks / total_time if total_time > 0 and blocks > 0 else 0)
+        for uid, name, blocks in contributions
+    ]
+    clean_ids = [row[0] for row in rows if row[0] not in flagged]
+    
+    async with bot.db_pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.executemany(f'''
+                INSERT INTO players (user_id, username, total_blocks_cleared, total_time_spent, best_speed, games_played, {best_column})
+                VALUES ($1, $2, $3, $4, $5, 1, $3)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    total_blocks_cleared = players.total_blocks_cleared + $3,
+                    total_time_spent = players.total_time_spent + $4,
+                    best_speed = CASE WHEN $5 > players.best_speed THEN $5 ELSE players.best_speed END,
+                    games_played = players.games_played + 1,
+                    {best_column} = CASE WHEN $3 > players.{best_column} THEN $3 ELSE players.{best_column} END
+            ''', rows)
+            
+            # Обновляем speed leaderboard
+            await conn.execute('''
+                INSERT INTO speed_leaderboard (user_id, username, avg_speed, total_blocks, total_time)
+                SELECT user_id, username,
+                       CASE WHEN total_time_spent > 0 THEN total_blocks_cleared / total_time_spent ELSE 0 END,
+                       total_blocks_cleared, total_time_spent
+                FROM players WHERE user_id = ANY($1::bigint[])
+                ON CONFLICT (user_id) DO UPDATE SET
+                    avg_speed = EXCLUDED.avg_speed, total_blocks = EXCLUDED.total_blocks,
+                    total_time = EXCLUDED.total_time, last_updated = NOW()
+            ''', clean_ids)
             
-            game.generate_block(new_block_1)
-            game.generate_block(new_block_2)
-            game.current_max_block = new_block_2
+            await flush_timings(conn, game, clean_ids)
             
-            # Отправляем новые блоки
-            await send_block(thread, game, new_block_1, view.user_id, view.thread_id)
-            await send_block(thread, game, new_block_2, view.user_id, view.thread_id)
+            if flagged:
+                await conn.executemany('''
+                    INSERT INTO flagged_games (user_id, mode, blocks, total_time, score, reasons)
+                    VALUES ($1, $2, $3, $4, $5, $6)
+                ''', [
+                    (uid, game.mode, blocks, total_time, flagged[uid][1], ','.join(flagged[uid][2]))
+                    for uid, _, blocks in contributions if uid in flagged
+                ])
+
+async def send_lane(thread, game: MinesweeperGame, lane: int, user_id: int, thread_id: int):
+    """Отправляет блоки дорожки. Если блок не отправить, дорожка снимается и откроется заново"""
+    for block_idx in list(game.lanes[lane]['blocks']):
+        for attempt in range(SEND_ATTEMPTS):
+            try:
+                await send_block(thread, game, block_idx, user_id, thread_id)
+                break
+            except Exception as e:
+                print(f'❌ Не удалось отправить блок #{block_idx + 1} (попытка {attempt + 1}): {e}')
+                await asyncio.sleep(1 + attempt)
+        else:
+            # Недоставленный блок не пройти: убираем всю дорожку вместе с отправленными сообщениями
+            for msg_id in game.drop_lane(lane):
+                try:
+                    await thread.get_partial_message(msg_id).delete()
+                except:
+                    pass
+            return
 
 async def send_block(thread, game: MinesweeperGame, block_idx: int, user_id: int, thread_id: int):
     """Отправляет один блок 5x5"""
@@ -389,11 +887,13 @@ async def send_block(thread, game: MinesweeperGame, block_idx: int, user_id: int
     
     view = MinesweeperView(game, block_idx, user_id, thread_id)
     msg = await thread.send(
-        f"🎮 **Блок #{block_idx + 1}**{timer_text}",
+        f"🎮 **{game.block_title(block_idx)}**{timer_text}",
         view=view
     )
     
     game.blocks[block_idx]['message_id'] = msg.id
+    # Отсчёт времени блока — с момента, когда его видно игрокам
+    game.blocks[block_idx]['started_at'] = time.time()
 
 @bot.tree.command(name="minesweeper", description="Начать игру в бесконечный сапёр")
 @app_commands.describe(
@@ -436,18 +936,19 @@ async def minesweeper(interaction: discord.Interaction, mode: str = "normal", mu
     
     if multiplayer:
         welcome_text += "👥 Все могут играть!\n"
+        welcome_text += "🛤️ Новые игроки открывают параллельные дорожки блоков\n"
     
     welcome_text += "\n📊 **Механика:**\n"
-    welcome_text += "• Блоки выстроены вертикально\n"
+    welcome_text += "• Блоки идут вертикальными дорожками\n"
     welcome_text += "• Пройдите блок → он исчезнет\n"
     welcome_text += "• Новый блок появится снизу\n"
     welcome_text += "• Бесконечное поле вниз! ⬇️\n\nУдачи! 🍀"
     
     await thread.send(welcome_text)
     
-    # Отправляем первые 2 блока
-    await send_block(thread, game, 0, interaction.user.id, thread.id)
-    await send_block(thread, game, 1, interaction.user.id, thread.id)
+    # Отправляем блоки первой дорожки
+    for block_idx in game.lanes[0]['blocks']:
+        await send_block(thread, game, block_idx, interaction.user.id, thread.id)
     
     if mode == "hardcore":
         bot.loop.create_task(hardcore_timer_loop(thread.id, game, interaction.user.id))
@@ -456,39 +957,19 @@ async def minesweeper(interaction: discord.Interaction, mode: str = "normal", mu
 
 async def hardcore_timer_loop(thread_id: int, game: MinesweeperGame, user_id: int):
     """Таймер для хардкора"""
-    while game.hardcore_timer > 0:
+    while game.hardcore_timer > 0 and not game.is_over:
         await asyncio.sleep(0.5)
         game.hardcore_timer -= 0.5
         
-        if game.hardcore_timer <= 0:
+        if game.hardcore_timer <= 0 and not game.is_over:
+            game.is_over = True
             try:
                 thread = bot.get_channel(thread_id)
                 if thread:
                     total_time = time.time() - game.start_time
                     avg_speed = game.blocks_cleared / total_time if total_time > 0 and game.blocks_cleared > 0 else 0
                     
-                    async with bot.db_pool.acquire() as conn:
-                        await conn.execute('''
-                            INSERT INTO players (user_id, username, total_blocks_cleared, total_time_spent, best_speed, games_played, best_blocks_hardcore)
-                            VALUES ($1, '', $2, $3, $4, 1, $5)
-                            ON CONFLICT (user_id) DO UPDATE SET
-                                total_blocks_cleared = players.total_blocks_cleared + $2,
-                                total_time_spent = players.total_time_spent + $3,
-                                best_speed = CASE WHEN $4 > players.best_speed THEN $4 ELSE players.best_speed END,
-                                games_played = players.games_played + 1,
-                                best_blocks_hardcore = CASE WHEN $5 > players.best_blocks_hardcore THEN $5 ELSE players.best_blocks_hardcore END
-                        ''', user_id, game.blocks_cleared, total_time, avg_speed, game.blocks_cleared)
-                        
-                        total_blocks = await conn.fetchval('SELECT total_blocks_cleared FROM players WHERE user_id = $1', user_id)
-                        total_time_all = await conn.fetchval('SELECT total_time_spent FROM players WHERE user_id = $1', user_id)
-                        new_avg_speed = total_blocks / total_time_all if total_time_all > 0 else 0
-                        
-                        await conn.execute('''
-                            INSERT INTO speed_leaderboard (user_id, username, avg_speed, total_blocks, total_time)
-                            VALUES ($1, '', $2, $3, $4)
-                            ON CONFLICT (user_id) DO UPDATE SET
-                                avg_speed = $2, total_blocks = $3, total_time = $4, last_updated = NOW()
-                        ''', user_id, new_avg_speed, total_blocks, total_time_all)
+                    await save_game_stats(game, user_id, '', total_time)
                     
                     if thread_id in bot.active_games:
                         del bot.active_games[thread_id]
@@ -498,6 +979,7 @@ async def hardcore_timer_loop(thread_id: int, game: MinesweeperGame, user_id: in
                         f"Блоков пройдено: **{game.blocks_cleared}**\n"
                         f"Время игры: **{total_time:.2f}с**\n"
                         f"Средняя скорость: **{avg_speed:.3f} блоков/сек**"
+                        f"{contributions_text(game)}"
                     )
             except:
                 pass
@@ -717,6 +1199,29 @@ async def profile(interaction: discord.Interaction, user: discord.User = None):
         inline=False
     )
     
+    # Тайминги блоков по режимам (агрегаты хранятся в players)
+    timing_stats = ""
+    for mode, mode_name in (('normal', "🎮 Обычный"), ('hardcore', "💀 Хардкор")):
+        if player[f'fastest_block_{mode}'] is None:
+            continue
+        consistency = max(0.0, 1 - (player[f'block_cv_{mode}'] or 0)) * 100
+        timing_stats += (
+            f"**{mode_name}**\n"
+            f"```\n"
+            f"Быстрейший блок │ {player[f'fastest_block_{mode}']:.2f}с\n"
+            f"Медиана блока   │ {player[f'median_block_{mode}']:.2f}с\n"
+            f"Стабильность    │ {consistency:.0f}%\n"
+            f"```"
+        )
+    
+    if timing_stats:
+        timing_stats += f"Отклик на клик: **{player['avg_latency_ms']:.0f}мс**"
+        embed.add_field(
+            name="⏱️ Тайминги блоков",
+            value=timing_stats,
+            inline=False
+        )
+    
     # В среднем за игру
     if player['games_played'] > 0:
         avg_blocks_per_game = player['total_blocks_cleared'] / player['games_played']
@@ -744,6 +1249,7 @@ async def on_ready():
     print(f'✅ Бот запущен как {bot.user}')
     print(f'📊 Серверов: {len(bot.guilds)}')
     print(f'⚡ База данных подключена')
+    bot.report_startup()
 
 @bot.event
 async def on_thread_delete(thread):
@@ -0,0 +1,43 @@
+import random
+
+import anticheat
+
+def steady_clicks(count: int, interval: float):
+    return tuple(i * interval for i in range(count))
+
+def test_steady_human_is_not_flagged():
+    # Ровные клики раз в 0.5с, но с лишними кликами сверх 3BV
+    result = anticheat.score_game((1, steady_clicks(30, 0.5), 30, 20, 10, 15.0))
+    assert result[2] == ('uniform_intervals',)
+    assert not anticheat.is_flagged(result)
+
+def test_scripted_clicker_is_flagged():
+    result = anticheat.score_game((1, steady_clicks(100, 0.05), 100, 100, 20, 5.0))
+    assert set(result[2]) == {'uniform_intervals', 'inhuman_speed', 'minimal_clicks_at_speed'}
+    assert anticheat.is_flagged(result)
+
+def test_minimal_clicks_needs_speed_and_blocks():
+    slow = anticheat.score_game((1, (), 20, 20, 10, 100.0))
+    few_blocks = anticheat.score_game((1, (), 8, 8, anticheat.FAST_MIN_BLOCKS - 1, 1.0))
+    assert slow[1] == 0
+    assert few_blocks[1] == 0
+
+def test_non_positive_intervals_are_ignored():
+    # Дубли и обратный порядок не должны занижать медиану
+    clicks = []
+    for i in range(40):
+        t = i * 0.4 + random.Random(i).random() * 0.3
+        clicks += [t, t]
+    result = anticheat.score_game((1, tuple(clicks), 80, 40, 10, 20.0))
+    assert 'inhuman_speed' not in result[2]
+
+def test_too_few_intervals_skip_timing_checks():
+    result = anticheat.score_game((1, steady_clicks(anticheat.MIN_INTERVALS, 0.01), 50, 20, 3, 1.0))
+    assert result[1] == 0
+
+def test_synthetic_humans_are_not_flagged():
+    random.seed(0)
+    humans = [anticheat._synthetic_game(i, scripted=False) for i in range(500)]
+    bots = [anticheat._synthetic_game(i, scripted=True) for i in range(50)]
+    assert not any(anticheat.is_flagged(r) for r in anticheat.score_games(humans))
+    assert all(anticheat.is_flagged(r) for r in anticheat.score_games(bots))
@@ -0,0 +1,245 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('discord')
+pytest.importorskip('asyncpg')
+
+import main
+
+class FakeTransaction:
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeConn:
+    def __init__(self):
+        self.calls = []
+    
+    def transaction(self):
+        return FakeTransaction()
+    
+    async def execute(self, query, *args):
+        self.calls.append(('execute', query, args))
+    
+    async def executemany(self, query, rows):
+        self.calls.append(('executemany', query, list(rows)))
+    
+    async def copy_records_to_table(self, table, records, columns):
+        self.calls.append(('copy', table, list(records)))
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def acquire(self):
+        pool = self
+        
+        class Acquire:
+            async def __aenter__(self):
+                return pool.conn
+            
+            async def __aexit__(self, *exc):
+                return False
+        
+        return Acquire()
+
+def find_calls(conn, kind, fragment):
+    return [call for call in conn.calls if call[0] == kind and fragment in call[1]]
+
+def test_min_clicks_counts_zero_regions_and_isolated_numbers():
+    game = main.MinesweeperGame()
+    # Одна область нулей открывает все числа за клик
+    connected = [
+        [0, 0, 0, 1, -1],
+        [0, 0, 0, 1, 1],
+        [0, 0, 0, 0, 0],
+        [1, 1, 0, 0, 0],
+        [-1, 1, 0, 0, 0],
+    ]
+    # Нулей нет: каждую из 21 безопасной клетки нужно нажать
+    no_zeros = [
+        [1, 1, 2, 1, 1],
+        [1, -1, 2, -1, 1],
+        [2, 2, 4, 2, 2],
+        [1, -1, 2, -1, 1],
+        [1, 1, 2, 1, 1],
+    ]
+    assert game.min_clicks(connected) == 1
+    assert game.min_clicks(no_zeros) == 21
+
+def test_flagged_player_is_held_back_from_leaderboards(monkeypatch):
+    game = main.MinesweeperGame(is_multiplayer=True)
+    game.register_click(1, 'bot')
+    game.register_click(2, 'human')
+    game.players[1]['blocks'] = 20
+    game.players[2]['blocks'] = 2
+    game.block_times.extend([(1, 0.5, 5, 5), (2, 3.0, 9, 5)])
+    
+    async def fake_analyze(game, total_time):
+        return {1: (1, 1.0, ('uniform_intervals', 'inhuman_speed'))}
+    
+    conn = FakeConn()
+    monkeypatch.setattr(main, 'analyze_game', fake_analyze)
+    monkeypatch.setattr(main.bot, 'db_pool', FakePool(conn))
+    
+    asyncio.run(main.save_game_stats(game, 1, 'bot', 10.0))
+    
+    players_rows = find_calls(conn, 'executemany', 'INSERT INTO players')[0][2]
+    assert (1, 'bot', 0, 0.0, 0) in players_rows
+    assert (2, 'human', 2, 10.0, 0.2) in players_rows
+    
+    leaderboard = find_calls(conn, 'execute', 'INSERT INTO speed_leaderboard')[0]
+    assert leaderboard[2] == ([2],)
+    
+    copied = [call for call in conn.calls if call[0] == 'copy'][0][2]
+    assert [record[0] for record in copied] == [2]
+    
+    flagged = find_calls(conn, 'executemany', 'INSERT INTO flagged_games')[0][2]
+    assert flagged == [(1, 'normal', 20, 10.0, 1.0, 'uniform_intervals,inhuman_speed')]
+
+def test_analyze_game_sorts_clicks_by_time(monkeypatch):
+    game = main.MinesweeperGame()
+    game.register_click(1, 'player')
+    # Клики обработаны не в порядке нажатия
+    for clicked_at in (3.0, 1.0, 2.0):
+        game.record_click(1, 0, clicked_at, 0.05, 'safe')
+    
+    summaries = []
+    
+    def capture(batch):
+        summaries.extend(batch)
+        return [(uid, 0.0, ()) for uid, *_ in batch]
+    
+    monkeypatch.setattr(main.anticheat, 'score_games', capture)
+    monkeypatch.setattr(main.bot, 'anticheat_pool', ThreadPoolExecutor(max_workers=1))
+    
+    assert asyncio.run(main.analyze_game(game, 10.0)) == {}
+    assert summaries[0][1] == (1.0, 2.0, 3.0)
+
+class FailingThread:
+    def __init__(self, fail_after: int):
+        self.fail_after = fail_after
+        self.sent = 0
+        self.deleted = []
+    
+    async def send(self, content, view=None):
+        if self.sent >= self.fail_after:
+            raise RuntimeError('send failed')
+        self.sent += 1
+        thread = self
+        
+        class Message:
+            id = 1000 + thread.sent
+        
+        return Message()
+    
+    def get_partial_message(self, msg_id):
+        thread = self
+        
+        class Partial:
+            async def delete(self):
+                thread.deleted.append(msg_id)
+        
+        return Partial()
+
+def test_failed_lane_send_drops_lane_and_reopens_it(monkeypatch):
+    async def no_sleep(delay):
+        pass
+    
+    monkeypatch.setattr(main.asyncio, 'sleep', no_sleep)
+    
+    game = main.MinesweeperGame(is_multiplayer=True)
+    game.register_click(1, 'a')
+    game.register_click(2, 'b')
+    assert game.register_click(3, 'c') == 1
+    blocks = game.fill_lane(1)
+    
+    # Первый блок отправлен, второй — нет
+    thread = FailingThread(fail_after=1)
+    asyncio.run(main.send_lane(thread, game, 1, 1, 1))
+    
+    assert 1 not in game.lanes
+    assert not any(block_idx in game.blocks for block_idx in blocks)
+    assert thread.deleted == [1001]
+    
+    # Любой следующий клик снова открывает снятую дорожку
+    assert game.register_click(1, 'a') == 1
+
+def test_flush_timings_aggregates_per_mode_with_exact_clicks():
+    game = main.MinesweeperGame(mode='hardcore')
+    game.register_click(1, 'player')
+    game.players[1]['clicks'] = main.CLICK_BUFFER_SIZE + 10  # Буфер хранит не все клики
+    game.record_click(1, 0, 1.0, 0.05, 'safe')
+    game.block_times.append((1, 2.5, 6, 4))
+    
+    conn = FakeConn()
+    asyncio.run(main.flush_timings(conn, game, [1]))
+    
+    latency_rows = find_calls(conn, 'executemany', 'latency_samples')[0][2]
+    assert latency_rows == [(1, main.CLICK_BUFFER_SIZE + 10, 1, 50.0)]
+    
+    prune = find_calls(conn, 'execute', 'DELETE FROM block_times')[0]
+    assert prune[2] == ([1], 'hardcore', main.BLOCK_STATS_WINDOW)
+    
+    aggregate = find_calls(conn, 'execute', 'UPDATE players p')[0]
+    assert 'fastest_block_hardcore' in aggregate[1]
+    assert 'normal' not in aggregate[1]
+    assert aggregate[2] == ([1], 'hardcore')
+
+def make_scored_game():
+    game = main.MinesweeperGame()
+    game.register_click(1, 'player')
+    game.record_click(1, 0, 1.0, 0.05, 'safe')
+    return game
+
+class BrokenPool:
+    def __init__(self):
+        self.shut_down = False
+    
+    def submit(self, fn, *args):
+        raise main.BrokenProcessPool('worker died')
+    
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+def test_analyze_game_scores_in_forkserver_pool():
+    main.bot.create_anticheat_pool()
+    try:
+        assert main.bot.anticheat_pool._mp_context.get_start_method() == 'forkserver'
+        assert asyncio.run(main.analyze_game(make_scored_game(), 10.0)) == {}
+    finally:
+        main.bot.anticheat_pool.shutdown()
+        main.bot.anticheat_pool = None
+
+def test_broken_pool_is_replaced(monkeypatch):
+    broken = BrokenPool()
+    monkeypatch.setattr(main.bot, 'anticheat_pool', broken)
+    monkeypatch.setattr(main.bot, 'create_anticheat_pool', lambda: setattr(main.bot, 'anticheat_pool', 'fresh'))
+    
+    assert asyncio.run(main.analyze_game(make_scored_game(), 10.0)) == {}
+    assert broken.shut_down
+    assert main.bot.anticheat_pool == 'fresh'
+
+def test_hung_analysis_times_out(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    released = threading.Event()
+    
+    def hang(batch):
+        released.wait(5)
+        return []
+    
+    monkeypatch.setattr(main, 'ANTICHEAT_TIMEOUT', 0.1)
+    monkeypatch.setattr(main.anticheat, 'score_games', hang)
+    monkeypatch.setattr(main.bot, 'anticheat_pool', pool)
+    monkeypatch.setattr(main.bot, 'create_anticheat_pool', lambda: setattr(main.bot, 'anticheat_pool', 'fresh'))
+    
+    try:
+        assert asyncio.run(main.analyze_game(make_scored_game(), 10.0)) == {}
+        assert main.bot.anticheat_pool == 'fresh'
+    finally:
+        released.set()